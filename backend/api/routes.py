@@ -1,12 +1,17 @@
 """
 API routes for segmentation endpoints.
 """
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.background import BackgroundTasks
+from starlette.concurrency import iterate_in_threadpool
 from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
-import json
+import shutil
+import tempfile
+import orjson
 from core.model_registry import get_registry
 from core.preprocessing import preprocess_image, preprocess_video
 from core.postprocessing import (
@@ -17,9 +22,38 @@ from core.postprocessing import (
     aggregate_video_statistics
 )
 from core.streaming import stream_video_segmentation
+from core.batcher import get_batcher
 
 router = APIRouter()
 
+# Thread pool for CPU-bound work (decode, postprocess, encode) so the
+# async handlers never block the event loop
+_cpu_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+async def spool_upload_to_disk(file: UploadFile) -> str:
+    """
+    Stream an uploaded file to a named temp file without loading it
+    into memory, keeping the event loop free during the copy.
+
+    Returns:
+        Path to the temp file (caller owns cleanup)
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, shutil.copyfileobj, file.file, tmp
+        )
+    except BaseException:
+        # Failed uploads (client abort, disk full) have no cleanup task
+        # registered yet; don't leak the partial temp file
+        tmp.close()
+        cleanup_file(tmp.name)
+        raise
+    finally:
+        tmp.close()
+    return tmp.name
+
 
 def cleanup_file(path: str):
     """Remove temporary file."""
@@ -38,100 +72,157 @@ async def health_check() -> Dict[str, str]:
 
 
 @router.get("/models")
-async def get_models() -> Dict[str, Any]:
+async def get_models(request: Request) -> Response:
     """
     Get list of available models.
-    
+
     Returns:
-        Dict with models array
+        Cached JSON body with models array (ETag for 304 revalidation)
     """
     registry = get_registry()
-    models = registry.get_available_models()
-    return {"models": models}
+    body, etag = registry.get_models_response()
+
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
 
 
 @router.get("/models/{model_id}/classes")
-async def get_model_classes(model_id: str) -> Dict[str, Any]:
+async def get_model_classes(model_id: str, request: Request) -> Response:
     """
     Get class metadata for a specific model.
-    
+
     Args:
         model_id: Model identifier
-        
+
     Returns:
-        Dict with classes array containing class metadata
+        Cached JSON body with classes array (ETag for 304 revalidation)
     """
     try:
-        from core.constants import get_class_metadata
-        
         registry = get_registry()
-        _, config = registry.get_model(model_id)
-        
-        num_classes = config.get('num_classes', 4)
-        class_metadata = get_class_metadata(num_classes)
-        
-        return {"classes": class_metadata}
+        body, etag = registry.get_classes_response(model_id)
+
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": "public, max-age=300"}
+        )
     except KeyError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+def _postprocess_and_encode(
+    logits,
+    original_image,
+    original_size,
+    model_id: str,
+    config: Dict,
+    include: set
+) -> Dict[str, Any]:
+    """Sync postprocess + encode block, run on the CPU thread pool."""
+    result = process_segmentation_result(
+        logits,
+        original_image,
+        original_size,
+        model_type=config.get('type', 'segformer'),
+        input_shape=(config['input_size'], config['input_size']),
+        num_classes=config.get('num_classes', 4)
+    )
+
+    response = {
+        "model_id": model_id,
+        "classes": result['statistics']
+    }
+
+    # Only encode the images the client will actually render
+    if 'original' in include:
+        response["original_image"] = encode_image_to_base64(original_image)
+    if 'mask' in include:
+        response["mask_image"] = encode_image_to_base64(result['mask_image'], fmt='png')
+    if 'overlay' in include:
+        response["overlay_image"] = encode_image_to_base64(result['overlay_image'])
+
+    return response
+
+
 @router.post("/segment/image")
 async def segment_image(
     file: UploadFile = File(...),
-    model_id: str = Form(...)
+    model_id: str = Form(...),
+    include: str = Query("original,mask,overlay")
 ) -> Dict[str, Any]:
     """
     Segment a single image.
-    
+
     Args:
         file: Uploaded image file
         model_id: Model identifier
-        
+        include: Comma-separated images to encode in the response
+            (any of "original", "mask", "overlay")
+
     Returns:
         Segmentation results with masks and statistics
     """
     try:
-        # Get model
+        loop = asyncio.get_running_loop()
+
+        # Get model (first use loads the session and warms kernels, so
+        # keep it off the event loop)
         registry = get_registry()
-        session, config = registry.get_model(model_id)
-        
+        session, config, meta = await loop.run_in_executor(
+            _cpu_pool, registry.get_model, model_id
+        )
+
+        include_set = {part.strip() for part in include.split(',') if part.strip()}
+
         # Read file
         file_bytes = await file.read()
-        
-        # Preprocess
-        input_tensor, original_image, original_size = preprocess_image(
-            file_bytes,
-            input_size=config['input_size'],
-            normalize=config['normalize'],
-            mean=config.get('mean'),
-            std=config.get('std')
+
+        # Preprocess on a worker thread (CPU-bound decode/resize)
+        input_tensor, original_image, original_size = await loop.run_in_executor(
+            _cpu_pool,
+            lambda: preprocess_image(
+                file_bytes,
+                input_size=config['input_size'],
+                normalize=config['normalize'],
+                mean=config.get('mean'),
+                std=config.get('std')
+            )
         )
-        
-        # Run inference
+
+        # Run inference (segformer requests are coalesced into batches
+        # under concurrent load; YOLO outputs can't be batch-split)
         model_type = config.get('type', 'segformer')
-        logits = run_inference(session, input_tensor, model_type)
-        
-        # Postprocess
-        result = process_segmentation_result(
-            logits, 
-            original_image, 
-            original_size,
-            model_type=model_type,
-            input_shape=(config['input_size'], config['input_size']),
-            num_classes=config.get('num_classes', 4)
+        if model_type == "yolo":
+            logits = await loop.run_in_executor(
+                _cpu_pool,
+                lambda: run_inference(
+                    session, input_tensor, model_type, input_name=meta['input_name']
+                )
+            )
+        else:
+            logits = await get_batcher().infer(
+                model_id, session, meta['input_name'], input_tensor
+            )
+
+        # Postprocess and encode on a worker thread (CPU-bound blend/encode)
+        return await loop.run_in_executor(
+            _cpu_pool,
+            lambda: _postprocess_and_encode(
+                logits, original_image, original_size, model_id, config, include_set
+            )
         )
-        
-        # Encode images
-        return {
-            "model_id": model_id,
-            "classes": result['statistics'],
-            "original_image": encode_image_to_base64(original_image),
-            "mask_image": encode_image_to_base64(result['mask_image']),
-            "overlay_image": encode_image_to_base64(result['overlay_image'])
-        }
-        
+
     except KeyError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -159,21 +250,31 @@ async def segment_video(
     try:
         # Validate sample_rate
         sample_rate = max(1, min(30, sample_rate))  # Clamp between 1 and 30
-        
-        # Get model
+
+        loop = asyncio.get_running_loop()
+
+        # Get model (first use loads the session off the event loop)
         registry = get_registry()
-        session, config = registry.get_model(model_id)
-        
-        # Read file
-        file_bytes = await file.read()
-        print(f"Read {len(file_bytes)} bytes from uploaded file")
-        
-        # Create video with overlay
-        output_path = create_video_with_overlay(
-            file_bytes,
-            session,
-            config,
-            sample_rate=sample_rate
+        session, config, meta = await loop.run_in_executor(
+            _cpu_pool, registry.get_model, model_id
+        )
+
+        # Stream upload to disk (no full in-memory copy)
+        input_path = await spool_upload_to_disk(file)
+        background_tasks.add_task(cleanup_file, input_path)
+        print(f"Spooled upload to: {input_path}")
+
+        # Create video with overlay on a worker thread; its writer stage
+        # runs in the calling thread, so inline it would block the loop
+        # for the whole video
+        output_path = await loop.run_in_executor(
+            _cpu_pool,
+            lambda: create_video_with_overlay(
+                input_path,
+                session,
+                config,
+                sample_rate=sample_rate
+            )
         )
         print(f"Video created at: {output_path}")
         
@@ -224,25 +325,36 @@ async def segment_video_stream(
     try:
         # Validate sample_rate
         sample_rate = max(1, min(30, sample_rate))
-        
-        # Get model
+
+        # Get model (first use loads the session off the event loop)
         registry = get_registry()
-        session, config = registry.get_model(model_id)
-        
-        # Read file
-        file_bytes = await file.read()
-        print(f"Starting stream for {len(file_bytes)} bytes")
-        
+        session, config, meta = await asyncio.get_running_loop().run_in_executor(
+            _cpu_pool, registry.get_model, model_id
+        )
+
+        # Stream upload to disk (no full in-memory copy)
+        input_path = await spool_upload_to_disk(file)
+        print(f"Spooled upload to: {input_path}")
+
         async def generate():
             """Generate SSE events for each processed frame."""
-            for frame_data in stream_video_segmentation(
-                file_bytes,
-                session,
-                config,
-                sample_rate=sample_rate
-            ):
-                # Format as Server-Sent Event
-                yield f"data: {json.dumps(frame_data)}\n\n"
+            try:
+                # The sync generator does per-frame decode/inference/encode;
+                # iterate it on a worker thread so the event loop stays
+                # free to serve other requests during the stream
+                async for frame_data in iterate_in_threadpool(
+                    stream_video_segmentation(
+                        input_path,
+                        session,
+                        config,
+                        sample_rate=sample_rate
+                    )
+                ):
+                    # Format as Server-Sent Event (orjson returns bytes,
+                    # skipping the str round-trip per frame)
+                    yield b"data: " + orjson.dumps(frame_data) + b"\n\n"
+            finally:
+                cleanup_file(input_path)
         
         return StreamingResponse(
             generate(),
@@ -0,0 +1,133 @@
+"""
+Dynamic batching for coalescing concurrent inference requests.
+"""
+import asyncio
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Coalesce up to this many requests into one session.run call
+MAX_BATCH_SIZE = 8
+# How long to wait for more requests to arrive before running a batch
+BATCH_WINDOW_SECONDS = 0.010
+
+
+class DynamicBatcher:
+    """
+    Coalesces concurrent single-image requests into batched session.run calls.
+
+    Requests arriving within a short window are concatenated along the batch
+    axis and run together, amortizing ORT dispatch overhead under concurrent
+    load. Falls back to per-item runs for models without a dynamic batch axis.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        batch_window: float = BATCH_WINDOW_SECONDS
+    ):
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    async def infer(
+        self,
+        model_id: str,
+        session,
+        input_name: str,
+        input_tensor: np.ndarray
+    ) -> np.ndarray:
+        """
+        Submit one (1, C, H, W) tensor for inference.
+
+        Returns:
+            Logits tensor (1, num_classes, H, W)
+        """
+        queue = self._get_queue(model_id, session, input_name)
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((input_tensor, future))
+        return await future
+
+    def _get_queue(self, model_id: str, session, input_name: str) -> asyncio.Queue:
+        """Get (or lazily create) the queue and worker task for a model."""
+        if model_id not in self._queues:
+            self._queues[model_id] = asyncio.Queue()
+            self._workers[model_id] = asyncio.create_task(
+                self._worker(model_id, session, input_name)
+            )
+        return self._queues[model_id]
+
+    async def _worker(self, model_id: str, session, input_name: str) -> None:
+        """Background loop: gather a batch, run it, fulfill the futures."""
+        queue = self._queues[model_id]
+        loop = asyncio.get_running_loop()
+
+        while True:
+            items = [await queue.get()]
+
+            try:
+                # Gather more requests until the batch fills or the window closes
+                deadline = loop.time() + self.batch_window
+                while len(items) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._run_batch(session, input_name, items, loop)
+            except Exception as e:
+                # An error escaping _run_batch would otherwise kill this
+                # worker silently while its queue stays registered, leaving
+                # every later request awaiting a future that never resolves.
+                # Fail everything in flight and retire the worker so the
+                # next request recreates a fresh one.
+                while not queue.empty():
+                    items.append(queue.get_nowait())
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                self._queues.pop(model_id, None)
+                self._workers.pop(model_id, None)
+                return
+
+    async def _run_batch(
+        self,
+        session,
+        input_name: str,
+        items: List[Tuple[np.ndarray, asyncio.Future]],
+        loop
+    ) -> None:
+        """Run one batch in a worker thread and distribute the results."""
+        try:
+            tensors = [t for t, _ in items]
+            batch = np.concatenate(tensors, axis=0) if len(tensors) > 1 else tensors[0]
+            logits = await loop.run_in_executor(
+                None,
+                lambda: session.run(None, {input_name: batch})[0]
+            )
+            for i, (_, future) in enumerate(items):
+                if not future.done():
+                    future.set_result(logits[i:i + 1])
+        except Exception as e:
+            if len(items) == 1:
+                if not items[0][1].done():
+                    items[0][1].set_exception(e)
+                return
+            # Model may not support a dynamic batch axis; retry per item
+            for tensor, future in items:
+                await self._run_batch(session, input_name, [(tensor, future)], loop)
+
+
+# Global batcher instance
+_batcher = None
+
+
+def get_batcher() -> DynamicBatcher:
+    """Get the global dynamic batcher instance."""
+    global _batcher
+    if _batcher is None:
+        _batcher = DynamicBatcher()
+    return _batcher
@@ -52,27 +52,51 @@ COLOR_MAP_2 = {
     1: (255, 0, 0)       # Red - tissue
 }
 
+# Precomputed palettes: (num_classes, 3) uint8 arrays for vectorized
+# class-id -> RGB lookup (color_mask = palette[mask], a single gather).
+PALETTE_4 = np.array([COLOR_MAP_4[i] for i in range(4)], dtype=np.uint8)
+PALETTE_8 = np.array([COLOR_MAP_8[i] for i in range(8)], dtype=np.uint8)
+PALETTE_2 = np.array([COLOR_MAP_2[i] for i in range(2)], dtype=np.uint8)
+
 # Default (backwards compatibility)
 CLASS_METADATA = CLASS_METADATA_4
 COLOR_MAP = COLOR_MAP_4
 NUM_CLASSES = 4
 
+def _palette_lut(palette: np.ndarray) -> np.ndarray:
+    """Pad a palette to 256 rows so any uint8 class id gathers safely."""
+    lut = np.zeros((256, 3), dtype=np.uint8)
+    lut[:palette.shape[0]] = palette
+    return lut
+
+
+# Dispatch tables keyed by class count; metadata is frozen as tuples so
+# callers can't accidentally mutate the shared lists. Palettes are padded
+# to 256 rows: stray ids (e.g. from YOLO masks) map to black instead of
+# raising on the palette[mask] gather.
+PALETTES = {2: _palette_lut(PALETTE_2), 4: _palette_lut(PALETTE_4), 8: _palette_lut(PALETTE_8)}
+# BGR variants let the video paths color-map directly in OpenCV's native
+# channel order, skipping the RGB->BGR pass on every overlay frame
+PALETTES_BGR = {k: np.ascontiguousarray(v[:, ::-1]) for k, v in PALETTES.items()}
+COLOR_MAPS = {2: COLOR_MAP_2, 4: COLOR_MAP_4, 8: COLOR_MAP_8}
+METADATA = {
+    2: tuple(CLASS_METADATA_2),
+    4: tuple(CLASS_METADATA_4),
+    8: tuple(CLASS_METADATA_8)
+}
+
+
+def get_palette(num_classes: int, bgr: bool = False) -> np.ndarray:
+    """Get (256, 3) uint8 color palette LUT based on number of classes."""
+    luts = PALETTES_BGR if bgr else PALETTES
+    return luts.get(num_classes, luts[4])
+
 
 def get_color_map(num_classes: int):
     """Get color map based on number of classes."""
-    if num_classes == 2:
-        return COLOR_MAP_2
-    elif num_classes == 8:
-        return COLOR_MAP_8
-    else:
-        return COLOR_MAP_4
+    return COLOR_MAPS.get(num_classes, COLOR_MAP_4)
 
 
 def get_class_metadata(num_classes: int):
     """Get class metadata based on number of classes."""
-    if num_classes == 2:
-        return CLASS_METADATA_2
-    elif num_classes == 8:
-        return CLASS_METADATA_8
-    else:
-        return CLASS_METADATA_4
+    return METADATA.get(num_classes, METADATA[4])
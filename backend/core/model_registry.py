@@ -1,11 +1,15 @@
 """
 Model registry for loading and managing ONNX models.
 """
+import hashlib
 import json
 import os
+import threading
 from pathlib import Path
 from typing import Dict, List, Tuple
 import onnxruntime as ort
+from core.constants import get_palette, get_class_metadata
+from core.postprocessing_numba import warm_kernels
 
 
 class ModelRegistry:
@@ -21,7 +25,11 @@ class ModelRegistry:
         self.config_path = config_path
         self.models_config: List[Dict] = []
         self.sessions: Dict[str, ort.InferenceSession] = {}
+        self.meta: Dict[str, Dict] = {}
         self.base_dir = Path(config_path).parent.parent
+        self._lock = threading.Lock()
+        self._models_response: Tuple[bytes, str] = None
+        self._classes_responses: Dict[str, Tuple[bytes, str]] = {}
         
     def load_registry(self) -> None:
         """Load model configurations from JSON file."""
@@ -29,70 +37,188 @@ class ModelRegistry:
             data = json.load(f)
             self.models_config = data['models']
             
+    @staticmethod
+    def _build_session_options() -> ort.SessionOptions:
+        """Build tuned SessionOptions shared by all models."""
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        so.intra_op_num_threads = os.cpu_count() or 1
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.enable_mem_pattern = True
+        so.enable_cpu_mem_arena = True
+        return so
+
+    @staticmethod
+    def _select_providers() -> List:
+        """Pick the fastest available execution providers, CPU last."""
+        preferred = (
+            'CUDAExecutionProvider',
+            'OpenVINOExecutionProvider',
+            'DnnlExecutionProvider',
+            'CPUExecutionProvider'
+        )
+        available = ort.get_available_providers()
+        providers = []
+        for p in preferred:
+            if p not in available:
+                continue
+            if p == 'CUDAExecutionProvider':
+                # Exhaustive algo search costs a little at session init
+                # and picks the fastest conv kernels for these shapes
+                providers.append((p, {'cudnn_conv_algo_search': 'EXHAUSTIVE'}))
+            else:
+                providers.append(p)
+        return providers
+
     def initialize_models(self) -> None:
-        """Initialize ONNX Runtime sessions for all models."""
+        """Eagerly initialize ONNX Runtime sessions for all models."""
         for model_config in self.models_config:
-            model_id = model_config['id']
-            onnx_path = self.base_dir / model_config['onnx_path']
-            
-            # Check if ONNX file exists
-            if not onnx_path.exists():
-                print(f"Warning: Model file not found: {onnx_path}")
-                print(f"Skipping model: {model_id}")
-                continue
-            
-            # Create ONNX Runtime session
-            try:
-                session = ort.InferenceSession(
-                    str(onnx_path),
-                    providers=['CPUExecutionProvider']
-                )
-                self.sessions[model_id] = session
-                print(f"✓ Loaded model: {model_id}")
-            except Exception as e:
-                print(f"Error loading model {model_id}: {e}")
+            self._load_one(model_config)
+
+    def _load_one(self, model_config: Dict) -> None:
+        """Load one model's session and metadata (idempotent)."""
+        model_id = model_config['id']
+        if model_id in self.sessions:
+            return
+
+        onnx_path = self.base_dir / model_config['onnx_path']
+
+        # Prefer an int8 quantized model when one is configured
+        # (produced by scripts/quantize_models.py)
+        quantized_path = model_config.get('quantized_onnx_path')
+        if quantized_path is not None:
+            quantized_path = self.base_dir / quantized_path
+            if quantized_path.exists():
+                onnx_path = quantized_path
+            else:
+                print(f"Warning: Quantized model not found: {quantized_path}")
+                print(f"Falling back to fp32 model for: {model_id}")
+
+        # Check if ONNX file exists
+        if not onnx_path.exists():
+            print(f"Warning: Model file not found: {onnx_path}")
+            print(f"Skipping model: {model_id}")
+            return
+
+        # Create ONNX Runtime session
+        try:
+            session = ort.InferenceSession(
+                str(onnx_path),
+                sess_options=self._build_session_options(),
+                providers=self._select_providers()
+            )
+            # Cache I/O metadata once so hot paths don't re-query
+            # the session on every inference call
+            num_classes = model_config.get('num_classes', 4)
+            self.meta[model_id] = {
+                'input_name': session.get_inputs()[0].name,
+                'output_name': session.get_outputs()[0].name,
+                'output_shape': tuple(session.get_outputs()[0].shape),
+                'input_size': model_config['input_size'],
+                'palette': get_palette(num_classes),
+                'class_metadata': get_class_metadata(num_classes)
+            }
+            # Compile the postprocess kernels now rather than mid-request
+            warm_kernels(num_classes)
+            # Publish the session last so readers never see partial state
+            self.sessions[model_id] = session
+            # The loaded flag in the cached /models payload changed
+            self._models_response = None
+            print(f"✓ Loaded model: {model_id}")
+        except Exception as e:
+            print(f"Error loading model {model_id}: {e}")
                 
-    def get_model(self, model_id: str) -> Tuple[ort.InferenceSession, Dict]:
+    def get_model(self, model_id: str) -> Tuple[ort.InferenceSession, Dict, Dict]:
         """
-        Get ONNX session and config for a specific model.
-        
+        Get ONNX session, config, and cached metadata for a specific model.
+
         Args:
             model_id: Model identifier
-            
+
         Returns:
-            Tuple of (InferenceSession, model_config)
-            
+            Tuple of (InferenceSession, model_config, meta)
+
         Raises:
             KeyError: If model not found
         """
-        if model_id not in self.sessions:
-            raise KeyError(f"Model '{model_id}' not found or not loaded")
-            
         # Find config
         config = next(
             (m for m in self.models_config if m['id'] == model_id),
             None
         )
-        
-        return self.sessions[model_id], config
+        if config is None:
+            raise KeyError(f"Model '{model_id}' not found")
+
+        # Lazy load on first use; double-checked locking keeps the fast
+        # path lock-free once the session exists
+        if model_id not in self.sessions:
+            with self._lock:
+                if model_id not in self.sessions:
+                    self._load_one(config)
+
+        if model_id not in self.sessions:
+            raise KeyError(f"Model '{model_id}' not found or not loaded")
+
+        return self.sessions[model_id], config, self.meta[model_id]
     
     def get_available_models(self) -> List[Dict]:
         """
-        Get list of available (loaded) models.
-        
+        Get list of registered models.
+
         Returns:
-            List of model info dicts with id, name, description
+            List of model info dicts with id, name, description, and
+            whether the session is currently loaded
         """
         available = []
         for model in self.models_config:
-            if model['id'] in self.sessions:
-                available.append({
-                    'id': model['id'],
-                    'name': model['name'],
-                    'description': model['description']
-                })
+            available.append({
+                'id': model['id'],
+                'name': model['name'],
+                'description': model['description'],
+                'loaded': model['id'] in self.sessions
+            })
         return available
 
+    def get_models_response(self) -> Tuple[bytes, str]:
+        """
+        Get the serialized /models payload and its ETag.
+
+        Cached until the set of loaded sessions changes, so polling
+        clients mostly get 304s instead of re-serialized bodies.
+        """
+        if self._models_response is None:
+            body = json.dumps({'models': self.get_available_models()}).encode()
+            # RFC 7232 entity-tags are quoted strings
+            self._models_response = (body, f'"{hashlib.md5(body).hexdigest()}"')
+        return self._models_response
+
+    def get_classes_response(self, model_id: str) -> Tuple[bytes, str]:
+        """
+        Get the serialized class metadata payload and ETag for a model.
+
+        Reads only the config, so it never triggers a session load.
+
+        Raises:
+            KeyError: If model not found
+        """
+        if model_id not in self._classes_responses:
+            config = next(
+                (m for m in self.models_config if m['id'] == model_id),
+                None
+            )
+            if config is None:
+                raise KeyError(f"Model '{model_id}' not found")
+
+            num_classes = config.get('num_classes', 4)
+            body = json.dumps(
+                {'classes': list(get_class_metadata(num_classes))}
+            ).encode()
+            # RFC 7232 entity-tags are quoted strings
+            self._classes_responses[model_id] = (
+                body, f'"{hashlib.md5(body).hexdigest()}"'
+            )
+        return self._classes_responses[model_id]
+
 
 # Global registry instance
 _registry = None
@@ -107,9 +233,17 @@ def get_registry() -> ModelRegistry:
 
 
 def initialize_registry(config_path: str) -> ModelRegistry:
-    """Initialize the global model registry."""
+    """
+    Initialize the global model registry.
+
+    Sessions are loaded lazily on first use; set PRELOAD_MODELS=1 to load
+    every registered model eagerly at startup instead.
+    """
     global _registry
     _registry = ModelRegistry(config_path)
     _registry.load_registry()
-    _registry.initialize_models()
+    if os.environ.get('PRELOAD_MODELS', '').lower() in ('1', 'true', 'yes'):
+        _registry.initialize_models()
+    else:
+        print("Lazy model loading enabled (set PRELOAD_MODELS=1 to preload)")
     return _registry
@@ -1,40 +1,73 @@
 """
 Postprocessing pipeline for generating masks, overlays, and statistics.
 """
-import io
-import base64
+import queue
 import tempfile
+import threading
 import subprocess
 import os
 import numpy as np
-from PIL import Image
 import cv2
 from typing import Dict, List, Tuple
-from core.constants import CLASS_METADATA, COLOR_MAP, NUM_CLASSES, get_color_map, get_class_metadata
+from core.constants import CLASS_METADATA, COLOR_MAP, NUM_CLASSES, get_palette, get_class_metadata
+from core.preprocessing import preprocess_frame_into
+from core.postprocessing_numba import argmax_chw
 
+# pybase64 dispatches to a SIMD (SSSE3/AVX2) base64 codec; fall back to
+# the stdlib implementation if it is not installed
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
-def run_inference(session, input_tensor: np.ndarray, model_type: str = "segformer"):
+# PyAV gives direct access to FFmpeg encoders (libx264/NVENC) without the
+# cv2.VideoWriter + re-encode round-trip; optional dependency
+try:
+    import av
+except ImportError:
+    av = None
+
+
+def run_inference(
+    session,
+    input_tensor: np.ndarray,
+    model_type: str = "segformer",
+    input_name: str = None,
+    io_binding=None,
+    input_prebound: bool = False
+):
     """
     Run ONNX model inference.
-    
+
     Args:
         session: ONNX Runtime InferenceSession
         input_tensor: Preprocessed input tensor
         model_type: Type of model ("segformer" or "yolo")
-        
+        input_name: Cached input name (looked up from the session if None)
+        io_binding: Optional session.io_binding() with the output already
+            bound to CPU; reuses the output buffer across calls (video paths)
+        input_prebound: True when the caller bound an OrtValue over its
+            reusable input buffer once, so per-call input binding is skipped
+
     Returns:
         Logits tensor (1, num_classes, H, W) for segformer
         or YOLO output for yolo models
     """
-    input_name = session.get_inputs()[0].name
-    outputs = session.run(None, {input_name: input_tensor})
-    
+    if input_name is None:
+        input_name = session.get_inputs()[0].name
+
     if model_type == "yolo":
         # YOLO returns the full output (we'll process it in generate_mask)
-        return outputs
-    else:
-        # SegFormer returns logits as first output
-        return outputs[0]
+        return session.run(None, {input_name: input_tensor})
+
+    if io_binding is not None:
+        if not input_prebound:
+            io_binding.bind_cpu_input(input_name, input_tensor)
+        session.run_with_iobinding(io_binding)
+        return io_binding.get_outputs()[0].numpy()
+
+    # SegFormer returns logits as first output
+    return session.run(None, {input_name: input_tensor})[0]
 
 
 def generate_mask(logits, original_size: Tuple[int, int] = None, model_type: str = "segformer", input_shape: Tuple[int, int] = (640, 640)) -> np.ndarray:
@@ -82,7 +115,8 @@ def generate_mask(logits, original_size: Tuple[int, int] = None, model_type: str
     else:
         # SegFormer output processing
         # Argmax over classes: (1, C, H, W) -> (H, W)
-        mask = np.argmax(logits[0], axis=0).astype(np.uint8)
+        # (numba-parallel kernel when available, np.argmax otherwise)
+        mask = argmax_chw(logits[0])
     
     # Resize to original size if needed
     if original_size is not None:
@@ -95,84 +129,122 @@ def generate_mask(logits, original_size: Tuple[int, int] = None, model_type: str
     return mask
 
 
-def mask_to_color(mask: np.ndarray, num_classes: int = 4) -> np.ndarray:
+def mask_to_color(mask: np.ndarray, palette: np.ndarray) -> np.ndarray:
     """
     Convert class ID mask to RGB color mask.
-    
+
     Args:
         mask: Class ID array (H, W)
-        num_classes: Number of classes in the model
-        
+        palette: (256, 3) uint8 color palette LUT
+
     Returns:
         RGB color mask (H, W, 3)
     """
-    h, w = mask.shape
-    color_mask = np.zeros((h, w, 3), dtype=np.uint8)
-    
-    color_map = get_color_map(num_classes)
-    for class_id, color in color_map.items():
-        color_mask[mask == class_id] = color
-    
-    return color_mask
+    # Single fancy-indexing gather: one pass over the mask instead of
+    # one boolean-mask write per class
+    return palette[mask]
+
+
+# Premultiplied-alpha blend tables keyed by (palette bytes, alpha); each
+# is (256, 256, 3) uint8 so the blend is a single integer gather
+_blend_luts: Dict = {}
+_CHANNEL_IDX = np.arange(3)
+
+
+def _get_blend_lut(palette: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Get lut[class_id, pixel_value] = (1-alpha)*pixel + alpha*color.
+
+    Row 0 (background) is the identity so background pixels pass through
+    untouched; all per-pixel float multiplies collapse into the table.
+    """
+    key = (palette.tobytes(), alpha)
+    lut = _blend_luts.get(key)
+    if lut is None:
+        values = np.arange(256, dtype=np.float32)
+        lut = ((1.0 - alpha) * values[None, :, None]
+               + alpha * palette[:, None, :].astype(np.float32))
+        lut = np.clip(lut + 0.5, 0, 255).astype(np.uint8)
+        lut[0] = values.astype(np.uint8)[:, None]
+        _blend_luts[key] = lut
+    return lut
 
 
 def create_overlay(
-    original_image: Image.Image,
+    original_image: np.ndarray,
     color_mask: np.ndarray,
     mask: np.ndarray,
-    alpha: float = 0.4
-) -> Image.Image:
+    alpha: float = 0.4,
+    non_background: np.ndarray = None,
+    palette: np.ndarray = None
+) -> np.ndarray:
     """
     Create overlay by blending original image with color mask.
-    
+
     Args:
-        original_image: Original PIL Image
+        original_image: Original RGB image array
         color_mask: RGB color mask array
         mask: Class ID mask (to exclude background)
         alpha: Blending weight for color mask
-        
+        non_background: Optional precomputed (mask != 0) boolean map, so
+            callers that already scanned the mask don't pay for another
+        palette: Optional (256, 3) uint8 palette LUT; enables the pure
+            uint8 table-lookup blend with no float math per pixel
+
     Returns:
-        Overlay PIL Image
+        Overlay RGB array (H, W, 3)
     """
-    # Resize original image to match mask size
-    orig_array = np.array(original_image.resize(
+    # Resize original image to match mask size (cv2 resize avoids a
+    # PIL round-trip and is SIMD-accelerated; INTER_AREA for the
+    # typical downscale to model resolution)
+    orig_array = cv2.resize(
+        np.asarray(original_image),
         (color_mask.shape[1], color_mask.shape[0]),
-        Image.BILINEAR
-    ))
-    
-    # Create overlay
-    overlay = orig_array.copy()
-    
-    # Blend only where mask > 0 (not background)
-    non_background = mask > 0
-    overlay[non_background] = (
-        (1 - alpha) * orig_array[non_background] +
-        alpha * color_mask[non_background]
-    ).astype(np.uint8)
-    
-    return Image.fromarray(overlay)
+        interpolation=cv2.INTER_AREA
+    )
 
+    if palette is not None:
+        # One gather per pixel/channel; the identity background row
+        # makes the non_background select unnecessary
+        lut = _get_blend_lut(palette, alpha)
+        return lut[mask[..., None], orig_array, _CHANNEL_IDX]
 
-def calculate_statistics(mask: np.ndarray, num_classes: int = 4) -> List[Dict]:
+    # Blend the full frame in one SIMD pass, then keep the original
+    # pixels where the mask is background
+    blended = cv2.addWeighted(orig_array, 1.0 - alpha, color_mask, alpha, 0.0)
+    if non_background is None:
+        non_background = mask != 0
+    np.copyto(orig_array, blended, where=non_background[..., None])
+
+    return orig_array
+
+
+def calculate_statistics(mask: np.ndarray, num_classes: int = 4, counts: np.ndarray = None) -> List[Dict]:
     """
     Calculate per-class statistics.
-    
+
     Args:
         mask: Class ID array (H, W)
         num_classes: Number of classes in the model
-        
+        counts: Optional precomputed np.bincount of the mask
+
     Returns:
         List of class info dicts with statistics
     """
     total_pixels = mask.size
+
+    # One bincount pass yields all class counts at once instead of a
+    # full mask scan per class
+    if counts is None:
+        counts = np.bincount(mask.ravel(), minlength=num_classes)
+
     stats = []
-    
     class_metadata = get_class_metadata(num_classes)
     for class_info in class_metadata:
         class_id = class_info['id']
-        pixel_count = int(np.sum(mask == class_id))
+        pixel_count = int(counts[class_id])
         area_percent = (pixel_count / total_pixels) * 100
-        
+
         stats.append({
             'id': class_id,
             'name': class_info['name'],
@@ -184,59 +256,110 @@ def calculate_statistics(mask: np.ndarray, num_classes: int = 4) -> List[Dict]:
     return stats
 
 
-def encode_image_to_base64(image: Image.Image) -> str:
+def encode_image_bytes(image: np.ndarray, fmt: str = 'jpeg', quality: int = 85) -> Tuple[bytes, str]:
     """
-    Encode PIL Image to base64 PNG string.
-    
+    Encode an RGB image to compressed bytes via cv2.imencode.
+
+    JPEG (the default) is visually equivalent for originals/overlays and
+    far faster to encode than PNG; use fmt='png' for lossless masks or
+    fmt='webp' for smaller lossy payloads.
+
     Args:
-        image: PIL Image
-        
+        image: RGB image array (PIL Images are also accepted)
+        fmt: Output format ('jpeg', 'png' or 'webp')
+        quality: JPEG/WebP quality (ignored for PNG)
+
+    Returns:
+        Tuple of (encoded bytes, mime type)
+    """
+    # cv2 expects BGR channel order
+    bgr = np.asarray(image)[:, :, ::-1]
+
+    if fmt == 'png':
+        ok, buf = cv2.imencode('.png', bgr, [int(cv2.IMWRITE_PNG_COMPRESSION), 1])
+        mime = 'image/png'
+    elif fmt == 'webp':
+        ok, buf = cv2.imencode('.webp', bgr, [int(cv2.IMWRITE_WEBP_QUALITY), quality])
+        mime = 'image/webp'
+    else:
+        ok, buf = cv2.imencode('.jpg', bgr, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        mime = 'image/jpeg'
+
+    if not ok:
+        raise ValueError(f"Failed to encode image as {fmt}")
+
+    return buf.tobytes(), mime
+
+
+def encode_image_to_base64(image: np.ndarray, fmt: str = 'jpeg', quality: int = 85) -> str:
+    """
+    Encode an RGB image to a base64 data URI.
+
+    Args:
+        image: RGB image array (PIL Images are also accepted)
+        fmt: Output format ('jpeg', 'png' or 'webp')
+        quality: JPEG/WebP quality (ignored for PNG)
+
     Returns:
         Base64 encoded string with data URI prefix
     """
-    buffer = io.BytesIO()
-    image.save(buffer, format='PNG')
-    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return f"data:image/png;base64,{img_base64}"
+    data, mime = encode_image_bytes(image, fmt=fmt, quality=quality)
+    img_base64 = base64.b64encode(data).decode('ascii')
+    return f"data:{mime};base64,{img_base64}"
 
 
 def process_segmentation_result(
     logits,
-    original_image: Image.Image,
+    original_image: np.ndarray,
     original_size: Tuple[int, int],
     model_type: str = "segformer",
     input_shape: Tuple[int, int] = (640, 640),
-    num_classes: int = 4
+    num_classes: int = 4,
+    bgr: bool = False
 ) -> Dict:
     """
     Complete postprocessing pipeline for segmentation result.
-    
+
     Args:
         logits: Model output
-        original_image: Original PIL Image
+        original_image: Original image array (RGB, or BGR with bgr=True)
         original_size: Original image size (width, height)
         model_type: Type of model (\"segformer\" or \"yolo\")
         input_shape: Input size (width, height) for YOLO
         num_classes: Number of classes in the model
-        
+        bgr: True when original_image is BGR; the color mask and overlay
+            come back BGR so video paths skip a cvtColor per frame
+
     Returns:
-        Dict with mask, overlay, and statistics
+        Dict with mask, overlay, and statistics (images as ndarrays in
+        the input's channel order)
     """
-    # Generate mask
-    mask = generate_mask(logits, original_size, model_type, input_shape)
-    
+    # Generate mask at model resolution; color-map, blend, and compute
+    # statistics there (relative areas are resolution-invariant), then
+    # upscale the finished images once instead of every intermediate
+    mask = generate_mask(logits, None, model_type, input_shape)
+
     # Create color mask
-    color_mask = mask_to_color(mask, num_classes)
-    
+    palette = get_palette(num_classes, bgr=bgr)
+    color_mask = mask_to_color(mask, palette)
+
+    # One bincount scan of the mask feeds statistics; the LUT blend in
+    # create_overlay reads the mask directly and needs no foreground map
+    counts = np.bincount(mask.ravel(), minlength=num_classes)
+
     # Create overlay
-    overlay = create_overlay(original_image, color_mask, mask)
-    
+    overlay = create_overlay(original_image, color_mask, mask, palette=palette)
+
     # Calculate statistics
-    stats = calculate_statistics(mask, num_classes)
-    
-    # Convert to PIL Images for encoding
-    mask_image = Image.fromarray(color_mask)
-    
+    stats = calculate_statistics(mask, num_classes, counts=counts)
+
+    # Upscale the final images to the original resolution
+    if original_size is not None and original_size != (mask.shape[1], mask.shape[0]):
+        overlay = cv2.resize(overlay, original_size, interpolation=cv2.INTER_LINEAR)
+        mask_image = cv2.resize(color_mask, original_size, interpolation=cv2.INTER_NEAREST)
+    else:
+        mask_image = color_mask
+
     return {
         'mask': mask,
         'mask_image': mask_image,
@@ -256,43 +379,143 @@ def aggregate_video_statistics(frames_stats: List[List[Dict]], num_classes: int
     Returns:
         Aggregated class statistics
     """
-    aggregated = []
-    
     class_metadata = get_class_metadata(num_classes)
-    for class_info in class_metadata:
-        class_id = class_info['id']
-        
+
+    # Index each frame's stats by class id once, then aggregate with
+    # vectorized NumPy instead of a per-(frame, class) linear search
+    num_frames = len(frames_stats)
+    areas = np.zeros((num_frames, len(class_metadata)), dtype=np.float64)
+    present = np.zeros((num_frames, len(class_metadata)), dtype=bool)
+
+    for f, frame_stat in enumerate(frames_stats):
+        by_id = {s['id']: s for s in frame_stat}
+        for c, class_info in enumerate(class_metadata):
+            class_stat = by_id.get(class_info['id'])
+            if class_stat is not None and class_stat['present']:
+                present[f, c] = True
+                areas[f, c] = class_stat['area_percent']
+
+    frames_present = present.sum(axis=0)
+    avg_areas = areas.mean(axis=0) if num_frames else np.zeros(len(class_metadata))
+
+    aggregated = []
+    for c, class_info in enumerate(class_metadata):
         # Skip background
-        if class_id == 0:
+        if class_info['id'] == 0:
             continue
-        
-        frames_present = 0
-        total_area = 0.0
-        
-        for frame_stat in frames_stats:
-            class_stat = next(
-                (s for s in frame_stat if s['id'] == class_id),
-                None
-            )
-            if class_stat and class_stat['present']:
-                frames_present += 1
-                total_area += class_stat['area_percent']
-        
-        avg_area = total_area / len(frames_stats) if frames_stats else 0
-        
+
         aggregated.append({
-            'id': class_id,
+            'id': class_info['id'],
             'name': class_info['name'],
             'color': class_info['color'],
-            'frames_present': frames_present,
-            'avg_area_percent': round(avg_area, 2)
+            'frames_present': int(frames_present[c]),
+            'avg_area_percent': round(float(avg_areas[c]), 2)
         })
-    
+
     return aggregated
 
 
+def _nvenc_available() -> bool:
+    """Check whether FFmpeg exposes the NVIDIA hardware H.264 encoder."""
+    try:
+        av.codec.Codec('h264_nvenc', 'w')
+        return True
+    except Exception:
+        return False
+
+
+class _AvVideoWriter:
+    """cv2.VideoWriter-compatible wrapper around a PyAV H.264 encoder."""
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int):
+        codec = 'h264_nvenc' if _nvenc_available() else 'libx264'
+        self.container = av.open(output_path, mode='w', options={'movflags': '+faststart'})
+        self.stream = self.container.add_stream(codec, rate=round(fps) if fps > 0 else 30)
+        self.stream.width = width
+        self.stream.height = height
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.options = {'preset': 'ultrafast', 'tune': 'zerolatency', 'crf': '23'}
+        print(f"Using PyAV encoder: {codec}")
+
+    def write(self, bgr: np.ndarray) -> None:
+        frame = av.VideoFrame.from_ndarray(bgr, format='bgr24')
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def release(self) -> None:
+        for packet in self.stream.encode(None):
+            self.container.mux(packet)
+        self.container.close()
+
+
+class _FfmpegPipeWriter:
+    """cv2.VideoWriter-compatible wrapper piping raw BGR frames to ffmpeg.
+
+    Frames are encoded once by libx264 as they stream in, so there is no
+    intermediate file and no post-hoc re-encode pass.
+    """
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int):
+        self.proc = subprocess.Popen([
+            'ffmpeg', '-y',
+            '-f', 'rawvideo', '-pixel_format', 'bgr24',
+            '-video_size', f'{width}x{height}',
+            '-framerate', str(fps if fps > 0 else 30),
+            '-i', '-',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23',
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            output_path
+        ], stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        print("Using ffmpeg rawvideo pipe encoder: libx264")
+
+    def write(self, bgr: np.ndarray) -> None:
+        self.proc.stdin.write(bgr.tobytes())
+
+    def release(self) -> None:
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise ValueError("ffmpeg pipe encoder exited with an error")
+
+
+def _create_video_writer(output_path: str, fps: float, width: int, height: int):
+    """
+    Create the fastest available video writer.
+
+    Returns:
+        Tuple of (writer, web_ready) — web_ready means the output is
+        already browser-playable H.264/yuv420p and needs no re-encode
+    """
+    if av is not None:
+        try:
+            return _AvVideoWriter(output_path, fps, width, height), True
+        except Exception as e:
+            print(f"PyAV writer unavailable, falling back to ffmpeg pipe: {e}")
+
+    # ffmpeg pipe: single encode pass, already web-ready
+    try:
+        subprocess.run(['ffmpeg', '-version'], check=True, capture_output=True)
+        return _FfmpegPipeWriter(output_path, fps, width, height), True
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"ffmpeg unavailable, falling back to cv2: {e}")
+
+    # cv2 fallback: try codecs in order of web-compatibility preference
+    codecs = ['avc1', 'H264', 'X264', 'mp4v']
+    for codec in codecs:
+        try:
+            fourcc = cv2.VideoWriter_fourcc(*codec)
+            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            if out.isOpened():
+                print(f"Using codec: {codec}")
+                return out, False
+            out.release()
+        except:
+            continue
+
+    raise ValueError("Failed to create output video with any codec")
+
+
 def create_video_with_overlay(
-    video_bytes: bytes,
+    video_path: str,
     session,
     config: Dict,
     output_path: str = None,
@@ -300,31 +523,26 @@ def create_video_with_overlay(
 ) -> str:
     """
     Process video with frame sampling and create output video with segmentation overlays.
-    
+
     Args:
-        video_bytes: Raw video bytes
+        video_path: Path to input video file (caller owns cleanup)
         session: ONNX Runtime InferenceSession
         config: Model configuration
         output_path: Optional output path for video file
         sample_rate: Process every Nth frame (default 15 = ~2fps at 30fps input)
-        
+
     Returns:
         Path to output video file
     """
-    # Save input to temporary file
-    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_in:
-        tmp_in.write(video_bytes)
-        tmp_in_path = tmp_in.name
-    
     # Create output path
     if output_path is None:
         tmp_out = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
         output_path = tmp_out.name
         tmp_out.close()
-    
+
     try:
         # Open input video
-        cap = cv2.VideoCapture(tmp_in_path)
+        cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             raise ValueError("Failed to open video file")
@@ -339,106 +557,219 @@ def create_video_with_overlay(
         print(f"Video properties: {width}x{height} @ {fps}fps, {total_frames} frames")
         print(f"Frame sampling: Processing 1 out of every {sample_rate} frames (~{estimated_processed} frames)")
         
-        # Create video writer with H.264 codec for web compatibility
-        # Try different codecs in order of preference
-        codecs = ['avc1', 'H264', 'X264', 'mp4v']
-        out = None
-        
-        for codec in codecs:
-            try:
-                fourcc = cv2.VideoWriter_fourcc(*codec)
-                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                if out.isOpened():
-                    print(f"Using codec: {codec}")
-                    break
-                out.release()
-            except:
-                continue
-        
-        if out is None or not out.isOpened():
-            raise ValueError("Failed to create output video with any codec")
-        
+        # Create video writer (PyAV/libx264 when available, cv2 fallback)
+        out, web_ready = _create_video_writer(output_path, fps, width, height)
+
         input_size = config['input_size']
         normalize = config['normalize']
         mean = config.get('mean')
         std = config.get('std')
         model_type = config.get('type', 'segformer')
         num_classes = config.get('num_classes', 4)
-        
+
+        # Cache the input name once instead of re-querying per frame.
+        # No shared IOBinding in this path: its bound output is a single
+        # buffer whose views would be overwritten by the next run while
+        # the consumer stage is still reading them off the queue
+        input_name = session.get_inputs()[0].name
+
+        # Hoist normalization constants out of the frame loop; reversed
+        # because this path keeps frames in BGR order
+        mean_arr = std_arr = None
+        if normalize and mean is not None and std is not None:
+            mean_arr = np.array(mean[::-1], dtype=np.float32).reshape(1, 1, 3)
+            std_arr = np.array(std[::-1], dtype=np.float32).reshape(1, 1, 3)
+
+        # Bounded queues decouple the three stages so decode, inference,
+        # and blend/encode overlap (cv2 and ORT release the GIL)
+        preproc_q: queue.Queue = queue.Queue(maxsize=4)
+        encode_q: queue.Queue = queue.Queue(maxsize=4)
+        stage_errors = []
+        stop_decoding = threading.Event()
+
+        def decode_worker():
+            """Read frames and preprocess the sampled ones."""
+            try:
+                frame_idx = 0
+                while not stop_decoding.is_set():
+                    if frame_idx % sample_rate == 0:
+                        ret, frame = cap.read()
+                    else:
+                        # Skipped frames reuse the last overlay downstream,
+                        # so grab() advances the stream without paying the
+                        # retrieve/convert cost for pixels nobody reads
+                        ret = cap.grab()
+                        frame = None
+                    if not ret:
+                        break
+                    frame_idx += 1
+
+                    if frame is not None:
+                        # Stay in BGR end-to-end; the channel swap for the
+                        # model happens inside preprocess_frame_into
+                        resized = cv2.resize(
+                            frame,
+                            (input_size, input_size),
+                            interpolation=cv2.INTER_LINEAR
+                        )
+                        preproc_q.put((frame_idx, resized, frame))
+                    else:
+                        preproc_q.put((frame_idx, None, None))
+            except Exception as e:
+                stage_errors.append(e)
+            finally:
+                preproc_q.put(None)
+
+        def inference_worker():
+            """Run ORT inference on sampled frames; pass skipped ones through.
+
+            Sampled frames are accumulated into a small batch so one
+            session.run amortizes graph dispatch over several frames.
+            Skipped frames queue up behind the batch to keep output order.
+            """
+            # Buffers live on this thread and are reused for every frame
+            batch_size = 4 if model_type != "yolo" else 1
+            batch_buf = np.empty(
+                (batch_size, 3, input_size, input_size), dtype=np.float32
+            )
+            scratch = np.empty((input_size, input_size, 3), dtype=np.float32)
+            can_batch = batch_size > 1
+            pending = []  # (frame_idx, frame_bgr, batch slot or None)
+            filled = 0
+
+            def flush_batch():
+                nonlocal can_batch, filled
+                batch_logits = None
+                if filled:
+                    if can_batch and filled > 1:
+                        try:
+                            batch_logits = session.run(
+                                None, {input_name: batch_buf[:filled]}
+                            )[0]
+                        except Exception:
+                            # Model has no dynamic batch axis; stay per-frame
+                            can_batch = False
+                    if batch_logits is None:
+                        # session.run returns freshly owned arrays, safe
+                        # to hand across the queue
+                        batch_logits = [
+                            run_inference(
+                                session, batch_buf[i:i + 1], model_type,
+                                input_name=input_name
+                            )
+                            for i in range(filled)
+                        ]
+                for frame_idx, frame_bgr, slot in pending:
+                    if slot is None:
+                        encode_q.put((frame_idx, None, frame_bgr))
+                    elif isinstance(batch_logits, np.ndarray):
+                        encode_q.put(
+                            (frame_idx, batch_logits[slot:slot + 1], frame_bgr)
+                        )
+                    else:
+                        encode_q.put(
+                            (frame_idx, batch_logits[slot], frame_bgr)
+                        )
+                pending.clear()
+                filled = 0
+
+            try:
+                while True:
+                    item = preproc_q.get()
+                    if item is None:
+                        break
+                    frame_idx, resized, frame_bgr = item
+
+                    if resized is None:
+                        if pending:
+                            pending.append((frame_idx, frame_bgr, None))
+                        else:
+                            encode_q.put((frame_idx, None, frame_bgr))
+                        continue
+
+                    preprocess_frame_into(
+                        resized, batch_buf[filled:filled + 1],
+                        mean_arr, std_arr, scratch, normalize=normalize,
+                        swap_rb=True
+                    )
+                    pending.append((frame_idx, frame_bgr, filled))
+                    filled += 1
+                    if filled == batch_size:
+                        flush_batch()
+                flush_batch()
+            except Exception as e:
+                stage_errors.append(e)
+                # Unblock a decode stage stuck on the full queue so the
+                # joins below finish and the error propagates instead of
+                # hanging the request
+                stop_decoding.set()
+                while True:
+                    try:
+                        preproc_q.get_nowait()
+                    except queue.Empty:
+                        break
+            finally:
+                encode_q.put(None)
+
+        decode_thread = threading.Thread(target=decode_worker, daemon=True)
+        inference_thread = threading.Thread(target=inference_worker, daemon=True)
+        decode_thread.start()
+        inference_thread.start()
+
         frame_count = 0
         processed_count = 0
         last_overlay_bgr = None
-        
-        # Process each frame
+
+        # Consumer stage (this thread): blend overlays and write frames in order
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            item = encode_q.get()
+            if item is None:
                 break
-            
-            frame_count += 1
-            
-            # Decide if we should process this frame or reuse last overlay
-            should_process = (frame_count - 1) % sample_rate == 0
-            
-            if should_process:
+            frame_idx, logits, frame_bgr = item
+            frame_count = frame_idx
+
+            if logits is not None:
                 processed_count += 1
-                
-                # Convert BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                original_frame = Image.fromarray(frame_rgb)
-                
-                # Resize for model
-                resized_frame = original_frame.resize(
-                    (input_size, input_size),
-                    Image.BILINEAR
-                )
-                
-                # Convert to numpy and normalize
-                img_array = np.array(resized_frame, dtype=np.float32) / 255.0
-                
-                if normalize and mean is not None and std is not None:
-                    mean_arr = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
-                    std_arr = np.array(std, dtype=np.float32).reshape(1, 1, 3)
-                    img_array = (img_array - mean_arr) / std_arr
-                
-                # Transpose and add batch dimension
-                img_array = np.transpose(img_array, (2, 0, 1))
-                input_tensor = np.expand_dims(img_array, axis=0)
-                
-                # Run inference
-                logits = run_inference(session, input_tensor, model_type)
-                
-                # Generate overlay
+
+                # BGR in, BGR out: no cvtColor on either side of the blend
                 result = process_segmentation_result(
                     logits,
-                    original_frame,
-                    original_frame.size,
+                    frame_bgr,
+                    (frame_bgr.shape[1], frame_bgr.shape[0]),
                     model_type=model_type,
                     input_shape=(input_size, input_size),
-                    num_classes=num_classes
+                    num_classes=num_classes,
+                    bgr=True
                 )
-                
-                # Convert overlay to OpenCV format (RGB -> BGR)
-                overlay_np = np.array(result['overlay_image'])
-                last_overlay_bgr = cv2.cvtColor(overlay_np, cv2.COLOR_RGB2BGR)
-                
+                last_overlay_bgr = result['overlay_image']
+
                 if processed_count % 10 == 0:  # Log every 10 processed frames
                     print(f"Processed {processed_count}/{estimated_processed} key frames ({frame_count}/{total_frames} total)")
-            
+
             # Write frame (either newly processed or reused overlay)
             if last_overlay_bgr is not None:
                 out.write(last_overlay_bgr)
-            else:
+            elif frame_bgr is not None:
                 # Fallback: write original frame if no overlay yet
-                out.write(frame)
-        
+                out.write(frame_bgr)
+
+        decode_thread.join()
+        inference_thread.join()
+
         cap.release()
         out.release()
+
+        if stage_errors:
+            raise stage_errors[0]
         
         print(f"Video processing complete. Total frames: {frame_count}, Processed: {processed_count}")
         print(f"Speed improvement: ~{sample_rate}x faster")
         print(f"Output video saved to: {output_path}")
-        
+
+        # Already H.264/yuv420p with faststart: no re-encode needed
+        if web_ready:
+            return output_path
+
         # Re-encode with ffmpeg for better web compatibility
         final_output = output_path.replace('.mp4', '_web.mp4')
         try:
@@ -457,10 +788,10 @@ def create_video_with_overlay(
         except (subprocess.CalledProcessError, FileNotFoundError) as e:
             print(f"ffmpeg re-encoding failed, using original: {e}")
             return output_path
-        
-    finally:
-        # Clean up input temp file
+    except Exception:
+        # Clean up the partial output on failure
         try:
-            os.unlink(tmp_in_path)
-        except:
+            os.unlink(output_path)
+        except OSError:
             pass
+        raise
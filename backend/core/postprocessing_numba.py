@@ -0,0 +1,75 @@
+"""
+Optional Numba-accelerated kernels for postprocessing hot loops.
+
+Falls back to NumPy implementations when numba is not installed.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _argmax_chw_kernel(logits_2d, out_flat):
+        """Per-pixel argmax over the class axis of a (C, N) tensor."""
+        num_classes, num_pixels = logits_2d.shape
+        for i in prange(num_pixels):
+            best = logits_2d[0, i]
+            idx = np.uint8(0)
+            for c in range(1, num_classes):
+                v = logits_2d[c, i]
+                if v > best:
+                    best = v
+                    idx = np.uint8(c)
+            out_flat[i] = idx
+
+    def argmax_chw(logits: np.ndarray) -> np.ndarray:
+        """
+        Argmax over the class axis of a (C, H, W) tensor.
+
+        Single parallel pass holding the per-pixel best score in a
+        register, writing uint8 class ids directly.
+
+        Args:
+            logits: (C, H, W) float32 logits
+
+        Returns:
+            Class ID array (H, W) uint8
+        """
+        num_classes, h, w = logits.shape
+        logits_2d = np.ascontiguousarray(logits.reshape(num_classes, h * w))
+        out = np.empty(h * w, dtype=np.uint8)
+        _argmax_chw_kernel(logits_2d, out)
+        return out.reshape(h, w)
+else:
+    def argmax_chw(logits: np.ndarray) -> np.ndarray:
+        """
+        Argmax over the class axis of a (C, H, W) tensor (NumPy fallback).
+
+        Args:
+            logits: (C, H, W) float32 logits
+
+        Returns:
+            Class ID array (H, W) uint8
+        """
+        return np.argmax(logits, axis=0).astype(np.uint8)
+
+
+def warm_kernels(num_classes: int) -> None:
+    """
+    Trigger JIT compilation of the numba kernels ahead of traffic.
+
+    Called at model load so the one-off compile cost (mitigated but not
+    removed by cache=True) lands at startup instead of inside the first
+    request. No-op when numba is not installed — the NumPy fallbacks
+    have nothing to compile.
+    """
+    if not NUMBA_AVAILABLE:
+        return
+    # Numba specializes on dtype/ndim/layout, not extents, so a tiny
+    # dummy tensor compiles the same machine code the real shapes use
+    argmax_chw(np.zeros((max(num_classes, 1), 4, 4), dtype=np.float32))
@@ -1,10 +1,8 @@
 """
 Preprocessing pipelines for image and video inputs.
 """
-import io
 import cv2
 import numpy as np
-from PIL import Image
 from typing import Tuple, List, Dict
 import tempfile
 
@@ -15,38 +13,44 @@ def preprocess_image(
     normalize: bool = True,
     mean: List[float] = None,
     std: List[float] = None
-) -> Tuple[np.ndarray, Image.Image, Tuple[int, int]]:
+) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
     """
     Preprocess image for ONNX model inference.
-    
+
     Args:
         file_bytes: Raw image bytes
         input_size: Target size (width/height)
         normalize: Whether to apply normalization
         mean: Normalization mean values
         std: Normalization std values
-        
+
     Returns:
-        Tuple of (input_tensor, original_image, original_size)
+        Tuple of (input_tensor, original_image as RGB ndarray, original_size)
     """
-    # Decode image
-    original_image = Image.open(io.BytesIO(file_bytes)).convert('RGB')
-    original_size = original_image.size  # (width, height)
-    
+    # Decode image directly to an ndarray (no PIL round-trip)
+    bgr = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError("Failed to decode image")
+    original_image = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    original_size = (original_image.shape[1], original_image.shape[0])  # (width, height)
+
     # Resize to model input size
-    resized_image = original_image.resize((input_size, input_size), Image.BILINEAR)
-    
-    # Convert to numpy array
-    img_array = np.array(resized_image, dtype=np.float32)
-    
-    # Normalize to [0, 1]
-    img_array = img_array / 255.0
-    
-    # Apply mean/std normalization if needed
-    if normalize and mean is not None and std is not None:
-        mean = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
-        std = np.array(std, dtype=np.float32).reshape(1, 1, 3)
-        img_array = (img_array - mean) / std
+    resized_image = cv2.resize(
+        original_image,
+        (input_size, input_size),
+        interpolation=cv2.INTER_LINEAR
+    )
+
+    # Normalize to [0, 1] plus mean/std; models with normalization baked
+    # into the graph (normalize: false) take the raw 0-255 float frame
+    if normalize:
+        img_array = resized_image.astype(np.float32) / 255.0
+        if mean is not None and std is not None:
+            mean = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
+            std = np.array(std, dtype=np.float32).reshape(1, 1, 3)
+            img_array = (img_array - mean) / std
+    else:
+        img_array = resized_image.astype(np.float32)
     
     # Transpose: HWC -> CHW
     img_array = np.transpose(img_array, (2, 0, 1))
@@ -57,6 +61,54 @@ def preprocess_image(
     return input_tensor, original_image, original_size
 
 
+def preprocess_frame_into(
+    resized_rgb: np.ndarray,
+    out_tensor: np.ndarray,
+    mean_arr: np.ndarray = None,
+    std_arr: np.ndarray = None,
+    scratch: np.ndarray = None,
+    normalize: bool = True,
+    swap_rb: bool = False
+) -> np.ndarray:
+    """
+    Normalize a resized RGB frame into a preallocated input tensor.
+
+    Writes in place so video loops reuse one (1, 3, H, W) float32 buffer
+    per frame instead of allocating fresh tensors.
+
+    Args:
+        resized_rgb: (H, W, 3) uint8 frame already resized to model input
+        out_tensor: Preallocated (1, 3, H, W) float32 tensor to fill
+        mean_arr: Optional (1, 1, 3) float32 normalization mean, in the
+            frame's own channel order
+        std_arr: Optional (1, 1, 3) float32 normalization std, in the
+            frame's own channel order
+        scratch: Optional (H, W, 3) float32 scratch buffer
+        normalize: False for models with normalization baked into the
+            graph; feeds the raw 0-255 float frame
+        swap_rb: True when the frame is BGR and the model expects RGB;
+            the swap is folded into the CHW copy for free
+
+    Returns:
+        out_tensor (for convenience)
+    """
+    if scratch is None:
+        scratch = np.empty(resized_rgb.shape, dtype=np.float32)
+
+    if normalize:
+        np.divide(resized_rgb, 255.0, out=scratch)
+        if mean_arr is not None and std_arr is not None:
+            np.subtract(scratch, mean_arr, out=scratch)
+            np.divide(scratch, std_arr, out=scratch)
+    else:
+        np.copyto(scratch, resized_rgb)
+
+    # HWC -> CHW into the batch slot
+    chw = scratch.transpose(2, 0, 1)
+    out_tensor[0] = chw[::-1] if swap_rb else chw
+    return out_tensor
+
+
 def preprocess_video(
     file_bytes: bytes,
     input_size: int,
@@ -81,7 +133,7 @@ def preprocess_video(
         - index: frame index
         - time_seconds: timestamp
         - input_tensor: preprocessed tensor
-        - original_frame: PIL Image
+        - original_frame: RGB ndarray
     """
     # Save to temporary file (OpenCV needs file path)
     with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
@@ -114,25 +166,23 @@ def preprocess_video(
             if frame_idx % step == 0 and len(frames_data) < max_frames:
                 # Convert BGR to RGB
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                original_frame = Image.fromarray(frame_rgb)
-                
-                # Resize
-                resized_frame = original_frame.resize(
+
+                # Resize (SIMD-accelerated, no PIL round-trip)
+                resized_frame = cv2.resize(
+                    frame_rgb,
                     (input_size, input_size),
-                    Image.BILINEAR
+                    interpolation=cv2.INTER_LINEAR
                 )
-                
-                # Convert to numpy
-                img_array = np.array(resized_frame, dtype=np.float32)
-                
-                # Normalize to [0, 1]
-                img_array = img_array / 255.0
-                
-                # Apply mean/std normalization
-                if normalize and mean is not None and std is not None:
-                    mean_arr = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
-                    std_arr = np.array(std, dtype=np.float32).reshape(1, 1, 3)
-                    img_array = (img_array - mean_arr) / std_arr
+
+                # Normalize to [0, 1] plus mean/std
+                if normalize:
+                    img_array = resized_frame.astype(np.float32) / 255.0
+                    if mean is not None and std is not None:
+                        mean_arr = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
+                        std_arr = np.array(std, dtype=np.float32).reshape(1, 1, 3)
+                        img_array = (img_array - mean_arr) / std_arr
+                else:
+                    img_array = resized_frame.astype(np.float32)
                 
                 # Transpose: HWC -> CHW
                 img_array = np.transpose(img_array, (2, 0, 1))
@@ -147,7 +197,7 @@ def preprocess_video(
                     'index': frame_idx,
                     'time_seconds': round(time_seconds, 2),
                     'input_tensor': input_tensor,
-                    'original_frame': original_frame
+                    'original_frame': frame_rgb
                 })
             
             frame_idx += 1
@@ -1,31 +1,44 @@
 """
 Streaming utilities for real-time video segmentation.
 """
-import io
-import base64
-import tempfile
 import cv2
 import numpy as np
-from PIL import Image
+import onnxruntime as ort
 from typing import Dict, Generator
 from core.postprocessing import run_inference, process_segmentation_result
+from core.preprocessing import preprocess_frame_into
+
+# pybase64 dispatches to a SIMD (SSSE3/AVX2) base64 codec; fall back to
+# the stdlib implementation if it is not installed
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# PyTurboJPEG wraps libjpeg-turbo's SIMD JPEG encoder (~2-4x faster per
+# frame than cv2/libjpeg); fall back to cv2.imencode without it
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
 
 
 def stream_video_segmentation(
-    video_bytes: bytes,
+    video_path: str,
     session,
     config: Dict,
     sample_rate: int = 15
 ) -> Generator[Dict, None, None]:
     """
     Stream video segmentation results frame by frame.
-    
+
     Args:
-        video_bytes: Raw video bytes
+        video_path: Path to input video file (caller owns cleanup)
         session: ONNX Runtime InferenceSession
         config: Model configuration
         sample_rate: Process every Nth frame
-        
+
     Yields:
         Dict with frame data: {
             'frame_index': int,
@@ -35,131 +48,143 @@ def stream_video_segmentation(
             'done': bool
         }
     """
-    # Save input to temporary file
-    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_in:
-        tmp_in.write(video_bytes)
-        tmp_in_path = tmp_in.name
+    # Open input video
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise ValueError("Failed to open video file")
     
-    try:
-        # Open input video
-        cap = cv2.VideoCapture(tmp_in_path)
-        
-        if not cap.isOpened():
-            raise ValueError("Failed to open video file")
-        
-        # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        input_size = config['input_size']
-        normalize = config['normalize']
-        mean = config.get('mean')
-        std = config.get('std')
-        model_type = config.get('type', 'segformer')
-        num_classes = config.get('num_classes', 4)
+    # Get video properties
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    
+    input_size = config['input_size']
+    normalize = config['normalize']
+    mean = config.get('mean')
+    std = config.get('std')
+    model_type = config.get('type', 'segformer')
+    num_classes = config.get('num_classes', 4)
+
+    # Hoist normalization constants and preallocate reusable buffers so
+    # the frame loop doesn't reallocate tensors; mean/std are reversed
+    # because this path keeps frames in BGR order
+    mean_arr = std_arr = None
+    if normalize and mean is not None and std is not None:
+        mean_arr = np.array(mean[::-1], dtype=np.float32).reshape(1, 1, 3)
+        std_arr = np.array(std[::-1], dtype=np.float32).reshape(1, 1, 3)
+    input_buf = np.empty((1, 3, input_size, input_size), dtype=np.float32)
+    scratch = np.empty((input_size, input_size, 3), dtype=np.float32)
+
+    # Cache the input name and bind reusable input/output buffers once
+    # instead of re-binding per frame; the OrtValue wraps input_buf so
+    # preprocess_frame_into's in-place writes feed inference directly
+    input_name = session.get_inputs()[0].name
+    io_binding = None
+    input_prebound = False
+    if model_type != "yolo":
+        io_binding = session.io_binding()
+        io_binding.bind_output(session.get_outputs()[0].name, 'cpu')
+        try:
+            input_ort = ort.OrtValue.ortvalue_from_numpy(input_buf)
+            io_binding.bind_ortvalue_input(input_name, input_ort)
+            input_prebound = True
+        except Exception:
+            # Older ORT builds without OrtValue binding: bind per call
+            input_prebound = False
+
+    frame_count = 0
+    processed_count = 0
+    last_overlay_bgr = None
+    
+    print(f"Starting stream: {width}x{height} @ {fps}fps, {total_frames} frames")
+    
+    # Send initial metadata
+    yield {
+        'type': 'metadata',
+        'fps': fps,
+        'total_frames': total_frames,
+        'width': width,
+        'height': height,
+        'sample_rate': sample_rate
+    }
+    
+    # Process each frame
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
         
-        frame_count = 0
-        processed_count = 0
-        last_overlay_bgr = None
+        frame_count += 1
         
-        print(f"Starting stream: {width}x{height} @ {fps}fps, {total_frames} frames")
+        # Decide if we should process this frame or reuse last overlay
+        should_process = (frame_count - 1) % sample_rate == 0
         
-        # Send initial metadata
-        yield {
-            'type': 'metadata',
-            'fps': fps,
-            'total_frames': total_frames,
-            'width': width,
-            'height': height,
-            'sample_rate': sample_rate
-        }
+        if should_process:
+            processed_count += 1
+
+            # Stay in BGR end-to-end: the channel swap for the model is
+            # folded into preprocess_frame_into and the overlay comes
+            # back BGR, so neither cvtColor pass is needed
+            resized = cv2.resize(
+                frame,
+                (input_size, input_size),
+                interpolation=cv2.INTER_LINEAR
+            )
+            preprocess_frame_into(
+                resized, input_buf, mean_arr, std_arr, scratch,
+                normalize=normalize, swap_rb=True
+            )
+
+            # Run inference
+            logits = run_inference(
+                session, input_buf, model_type,
+                input_name=input_name, io_binding=io_binding,
+                input_prebound=input_prebound
+            )
+
+            # Generate overlay
+            result = process_segmentation_result(
+                logits,
+                frame,
+                (frame.shape[1], frame.shape[0]),
+                model_type=model_type,
+                input_shape=(input_size, input_size),
+                num_classes=num_classes,
+                bgr=True
+            )
+            last_overlay_bgr = result['overlay_image']
         
-        # Process each frame
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Decide if we should process this frame or reuse last overlay
-            should_process = (frame_count - 1) % sample_rate == 0
-            
-            if should_process:
-                processed_count += 1
-                
-                # Convert BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                original_frame = Image.fromarray(frame_rgb)
-                
-                # Resize for model
-                resized_frame = original_frame.resize(
-                    (input_size, input_size),
-                    Image.BILINEAR
-                )
-                
-                # Convert to numpy and normalize
-                img_array = np.array(resized_frame, dtype=np.float32) / 255.0
-                
-                if normalize and mean is not None and std is not None:
-                    mean_arr = np.array(mean, dtype=np.float32).reshape(1, 1, 3)
-                    std_arr = np.array(std, dtype=np.float32).reshape(1, 1, 3)
-                    img_array = (img_array - mean_arr) / std_arr
-                
-                # Transpose and add batch dimension
-                img_array = np.transpose(img_array, (2, 0, 1))
-                input_tensor = np.expand_dims(img_array, axis=0)
-                
-                # Run inference
-                logits = run_inference(session, input_tensor, model_type)
-                
-                # Generate overlay
-                result = process_segmentation_result(
-                    logits,
-                    original_frame,
-                    original_frame.size,
-                    model_type=model_type,
-                    input_shape=(input_size, input_size),
-                    num_classes=num_classes
+        # Encode frame to base64
+        if last_overlay_bgr is not None:
+            # Encode to JPEG for smaller size
+            if _turbo_jpeg is not None:
+                jpeg_bytes = _turbo_jpeg.encode(
+                    last_overlay_bgr, quality=85, pixel_format=TJPF_BGR
                 )
-                
-                # Convert overlay to OpenCV format (RGB -> BGR)
-                overlay_np = np.array(result['overlay_image'])
-                last_overlay_bgr = cv2.cvtColor(overlay_np, cv2.COLOR_RGB2BGR)
-            
-            # Encode frame to base64
-            if last_overlay_bgr is not None:
-                # Encode to JPEG for smaller size
+            else:
                 _, buffer = cv2.imencode('.jpg', last_overlay_bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                frame_base64 = base64.b64encode(buffer).decode('utf-8')
-                
-                # Yield frame data
-                yield {
-                    'type': 'frame',
-                    'frame_index': frame_count,
-                    'total_frames': total_frames,
-                    'processed_count': processed_count,
-                    'frame_data': f'data:image/jpeg;base64,{frame_base64}',
-                    'progress': (frame_count / total_frames) * 100
-                }
-        
-        cap.release()
-        
-        # Send completion signal
-        yield {
-            'type': 'complete',
-            'total_frames': frame_count,
-            'processed_frames': processed_count
-        }
-        
-        print(f"Stream complete. Frames: {frame_count}, Processed: {processed_count}")
-        
-    finally:
-        # Clean up input temp file
-        import os
-        try:
-            os.unlink(tmp_in_path)
-        except:
-            pass
+                jpeg_bytes = buffer.tobytes()
+            frame_base64 = base64.b64encode(jpeg_bytes).decode('utf-8')
+            
+            # Yield frame data
+            yield {
+                'type': 'frame',
+                'frame_index': frame_count,
+                'total_frames': total_frames,
+                'processed_count': processed_count,
+                'frame_data': f'data:image/jpeg;base64,{frame_base64}',
+                'progress': (frame_count / total_frames) * 100
+            }
+    
+    cap.release()
+    
+    # Send completion signal
+    yield {
+        'type': 'complete',
+        'total_frames': frame_count,
+        'processed_frames': processed_count
+    }
+    
+    print(f"Stream complete. Frames: {frame_count}, Processed: {processed_count}")
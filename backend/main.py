@@ -3,6 +3,7 @@ FastAPI main application for gynecology laparoscopic segmentation.
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pathlib import Path
 from core.model_registry import initialize_registry
 from api.routes import router
@@ -12,7 +13,8 @@ import uvicorn
 app = FastAPI(
     title="Gynecology Segmentation API",
     description="Multi-model segmentation for laparoscopic images and videos",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration
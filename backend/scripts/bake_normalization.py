@@ -0,0 +1,95 @@
+"""
+One-off script to fold input normalization into an ONNX model graph.
+
+Rewrites the graph so the model computes (x/255 - mean)/std itself as a
+single fused Mul + Add on the raw 0-255 float input (ORT folds this into
+the first conv). After baking, set "normalize": false on the model's
+entry in config/models.json so the Python side skips per-frame float math.
+
+Usage:
+    python scripts/bake_normalization.py [--model-id segformer_b0 ...]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper
+
+
+def bake_model(model_path: Path, out_path: Path, mean, std) -> None:
+    """Prepend fused normalization to the model's input."""
+    model = onnx.load(str(model_path))
+    graph = model.graph
+
+    input_proto = graph.input[0]
+    input_name = input_proto.name
+    raw_name = input_name + '_raw'
+
+    # (x/255 - mean)/std == x * 1/(255*std) + (-mean/std)
+    mean = np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+    std = np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+    scale = (1.0 / (255.0 * std)).astype(np.float32)
+    bias = (-mean / std).astype(np.float32)
+
+    graph.initializer.extend([
+        numpy_helper.from_array(scale, name=raw_name + '_scale'),
+        numpy_helper.from_array(bias, name=raw_name + '_bias')
+    ])
+
+    scaled_name = raw_name + '_scaled'
+    norm_nodes = [
+        helper.make_node('Mul', [raw_name, raw_name + '_scale'], [scaled_name]),
+        helper.make_node('Add', [scaled_name, raw_name + '_bias'], [input_name])
+    ]
+
+    # The graph now consumes the raw input through the new nodes
+    input_proto.name = raw_name
+    graph.node.insert(0, norm_nodes[1])
+    graph.node.insert(0, norm_nodes[0])
+
+    onnx.checker.check_model(model)
+    onnx.save(model, str(out_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fold (x/255 - mean)/std normalization into ONNX models"
+    )
+    parser.add_argument('--model-id', action='append', default=None,
+                        help="Model id(s) to bake (default: all normalized models)")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).parent.parent
+    config_path = base_dir / 'config' / 'models.json'
+
+    with open(config_path, 'r') as f:
+        models = json.load(f)['models']
+
+    for model_config in models:
+        if args.model_id and model_config['id'] not in args.model_id:
+            continue
+        if not model_config.get('normalize'):
+            continue
+
+        model_path = base_dir / model_config['onnx_path']
+        if not model_path.exists():
+            print(f"Skipping {model_config['id']}: {model_path} not found")
+            continue
+
+        out_path = model_path.with_name(model_path.stem + '_normbaked.onnx')
+        print(f"Baking normalization: {model_config['id']} -> {out_path.name}")
+        bake_model(
+            model_path,
+            out_path,
+            model_config.get('mean', [0.0, 0.0, 0.0]),
+            model_config.get('std', [1.0, 1.0, 1.0])
+        )
+        rel_path = out_path.relative_to(base_dir)
+        print(f"  Done. Point \"onnx_path\" at \"{rel_path}\" and set "
+              f"\"normalize\": false for '{model_config['id']}' in models.json")
+
+
+if __name__ == '__main__':
+    main()
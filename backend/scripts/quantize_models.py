@@ -0,0 +1,129 @@
+"""
+One-off script to quantize registered ONNX models to int8 (static QDQ).
+
+Usage:
+    python scripts/quantize_models.py --calibration-dir path/to/images [--max-samples 100]
+
+For each model in config/models.json, writes a quantized model next to the
+fp32 file (e.g. models/segformer_b0_int8.onnx). Add the resulting path to
+the model's config as "quantized_onnx_path" so the registry prefers it.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_static
+)
+
+# Allow running from the scripts/ directory
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.preprocessing import preprocess_image  # noqa: E402
+
+
+class ImageCalibrationDataReader(CalibrationDataReader):
+    """Feeds preprocessed sample images to the static quantizer."""
+
+    def __init__(self, image_paths, input_name, input_size, normalize, mean, std):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.input_size = input_size
+        self.normalize = normalize
+        self.mean = mean
+        self.std = std
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        input_tensor, _, _ = preprocess_image(
+            path.read_bytes(),
+            input_size=self.input_size,
+            normalize=self.normalize,
+            mean=self.mean,
+            std=self.std
+        )
+        return {self.input_name: input_tensor}
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def quantize_model(model_config, base_dir, calibration_paths):
+    """Quantize one model from its registry config. Returns output path."""
+    fp32_path = base_dir / model_config['onnx_path']
+    if not fp32_path.exists():
+        print(f"Skipping {model_config['id']}: {fp32_path} not found")
+        return None
+
+    int8_path = fp32_path.with_name(fp32_path.stem + '_int8.onnx')
+
+    session = ort.InferenceSession(str(fp32_path), providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+
+    reader = ImageCalibrationDataReader(
+        calibration_paths,
+        input_name,
+        model_config['input_size'],
+        model_config['normalize'],
+        model_config.get('mean'),
+        model_config.get('std')
+    )
+
+    print(f"Quantizing {model_config['id']} -> {int8_path.name}")
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        calibration_data_reader=reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QInt8,
+        op_types_to_quantize=['Conv', 'MatMul', 'Gemm']
+    )
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize registered ONNX models to int8")
+    parser.add_argument('--calibration-dir', required=True,
+                        help="Directory of representative images for calibration")
+    parser.add_argument('--max-samples', type=int, default=100,
+                        help="Maximum number of calibration images")
+    args = parser.parse_args()
+
+    base_dir = Path(__file__).parent.parent
+    config_path = base_dir / 'config' / 'models.json'
+
+    with open(config_path, 'r') as f:
+        models = json.load(f)['models']
+
+    calibration_dir = Path(args.calibration_dir)
+    calibration_paths = sorted(
+        p for p in calibration_dir.iterdir()
+        if p.suffix.lower() in ('.jpg', '.jpeg', '.png')
+    )[:args.max_samples]
+
+    if not calibration_paths:
+        print(f"No calibration images found in {calibration_dir}")
+        sys.exit(1)
+
+    print(f"Using {len(calibration_paths)} calibration images")
+
+    for model_config in models:
+        out_path = quantize_model(model_config, base_dir, calibration_paths)
+        if out_path is not None:
+            rel_path = out_path.relative_to(base_dir)
+            print(f"  Done. Add \"quantized_onnx_path\": \"{rel_path}\" "
+                  f"to the '{model_config['id']}' entry in models.json")
+
+
+if __name__ == '__main__':
+    main()